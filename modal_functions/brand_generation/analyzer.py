@@ -20,6 +20,45 @@ image = modal.Image.debian_slim().pip_install(
     "pydantic>=2.0.0"
 )
 
+# CPU embedding image for the semantic cache
+cache_image = modal.Image.debian_slim().pip_install(
+    "numpy>=1.24.0",
+    "sentence-transformers>=2.2.0"
+)
+
+# Volume for the semantic cache index and embedding model weights
+brand_cache = modal.Volume.from_name("brand-cache", create_if_missing=True)
+
+# Per-container semantic cache, loaded on first use
+_semantic_cache = None
+
+# Seconds between publishing this container's cache stats and picking up
+# other containers' entries
+CACHE_SYNC_INTERVAL = 30.0
+_last_cache_sync = 0.0
+
+
+def _sync_semantic_cache(added: bool):
+    """
+    Commit and reload the cache volume only when needed
+
+    A volume commit is a network round trip, so hits never pay for one:
+    stats are published on the CACHE_SYNC_INTERVAL timer, and entries are
+    committed right after add() on the miss/seed path, which already waits
+    on a Claude call.
+    """
+    import time
+
+    global _last_cache_sync
+    due = time.monotonic() - _last_cache_sync > CACHE_SYNC_INTERVAL
+    if added or due:
+        _semantic_cache.save_stats()
+        brand_cache.commit()
+    if due:
+        brand_cache.reload()
+        _semantic_cache.refresh()
+        _last_cache_sync = time.monotonic()
+
 
 @stub.function(
     image=image,
@@ -32,7 +71,8 @@ def analyze_brand(
     business_idea: str,
     target_audience: str,
     style: str = "modern",
-    industry: Optional[str] = None
+    industry: Optional[str] = None,
+    seed_analysis: Optional[dict] = None
 ) -> dict:
     """
     Analyze brand strategy using Claude AI
@@ -42,6 +82,7 @@ def analyze_brand(
         target_audience: Target customer description
         style: Design style (modern, classic, bold, minimal)
         industry: Optional industry categorization
+        seed_analysis: Optional analysis of a similar business to adapt
 
     Returns:
         dict containing brand analysis with:
@@ -70,6 +111,7 @@ Business Idea: {business_idea}
 Target Audience: {target_audience}
 Style Preference: {style}
 {f"Industry: {industry}" if industry else ""}
+{f"A closely related business was previously analyzed as follows. Use it as a starting point and adapt it to this business:{chr(10)}{json.dumps(seed_analysis)}" if seed_analysis else ""}
 
 Generate a strategic brand analysis with the following:
 
@@ -170,30 +212,133 @@ def validate_color_contrast(color1: str, color2: str) -> dict:
 
 @stub.function(
     image=image,
-    secrets=[modal.Secret.from_name("claude-api-key")],
     cpu=2.0,
-    memory=4096
+    memory=4096,
+    timeout=900  # batch SLA plus headroom
 )
-async def analyze_brand_batch(inputs: list[dict]) -> list[dict]:
+async def analyze_brand_batch(
+    inputs: list[dict],
+    priority: str = "batch",
+    tenant: str = "default"
+) -> list[dict]:
     """
     Analyze multiple brands in parallel
 
+    Calls go through the shared dispatcher (dispatcher.py), so bulk jobs
+    queue behind interactive requests and count against the tenant's quota.
+
     Args:
         inputs: List of dicts with brand analysis inputs
+        priority: Scheduling class ("batch" or "background")
+        tenant: Tenant identifier for quota accounting
 
     Returns:
         List of brand analysis results
+
+    Raises:
+        AdmissionRejected: if an input cannot be scheduled within the SLA
     """
-    # Process all inputs in parallel
-    results = await analyze_brand.map(
-        [i["business_idea"] for i in inputs],
-        [i["target_audience"] for i in inputs],
-        [i.get("style", "modern") for i in inputs],
-        [i.get("industry") for i in inputs]
-    )
+    import asyncio
+
+    dispatcher = modal.Cls.lookup("machups-dispatcher", "Dispatcher")()
+    results = await asyncio.gather(*[
+        dispatcher.analyze.remote.aio(
+            business_idea=i["business_idea"],
+            target_audience=i["target_audience"],
+            style=i.get("style", "modern"),
+            industry=i.get("industry"),
+            priority=priority,
+            tenant=tenant
+        )
+        for i in inputs
+    ])
     return list(results)
 
 
+@stub.function(
+    image=cache_image,
+    volumes={"/cache": brand_cache},
+    mounts=[modal.Mount.from_local_python_packages("modal_functions")],
+    cpu=2.0,
+    memory=4096,
+    timeout=300
+)
+def analyze_brand_cached(
+    business_idea: str,
+    target_audience: str,
+    style: str = "modern",
+    industry: Optional[str] = None
+) -> dict:
+    """
+    Analyze brand strategy, reusing prior analyses of near-duplicate ideas
+
+    Inputs are normalized and embedded on CPU, then matched against earlier
+    analyses with the same style and industry. Close matches are returned
+    directly; looser matches seed a fresh analyze_brand call.
+
+    Each container appends to its own shard of the cache volume. Every
+    CACHE_SYNC_INTERVAL seconds it publishes its stats and reloads the
+    volume to pick up entries written by other containers.
+
+    Returns:
+        Brand analysis dict (see analyze_brand) with a "cache" entry:
+        - status: "hit", "seed" or "miss"
+        - similarity: Cosine similarity to the nearest prior input with the
+          same style and industry (None if there is none)
+        - lookup_ms: Semantic lookup latency
+    """
+    import time
+    from modal_functions.utils.semantic_cache import SemanticCache, cache_scope, load_embedder
+
+    global _semantic_cache, _last_cache_sync
+    if _semantic_cache is None:
+        _semantic_cache = SemanticCache(
+            load_embedder(cache_dir="/cache/models"),
+            path="/cache/semantic"
+        )
+        _last_cache_sync = time.monotonic()
+
+    text = f"{business_idea}\n{target_audience}"
+    scope = cache_scope(style, industry)
+    match = _semantic_cache.lookup(text, scope=scope)
+
+    cache_info = {
+        "status": match["status"],
+        "similarity": match["similarity"],
+        "lookup_ms": match["lookup_ms"]
+    }
+
+    if match["status"] == "hit":
+        _sync_semantic_cache(added=False)
+        return {**match["result"], "cache": cache_info}
+
+    result = analyze_brand.remote(
+        business_idea=business_idea,
+        target_audience=target_audience,
+        style=style,
+        industry=industry,
+        seed_analysis=match["result"]
+    )
+
+    _semantic_cache.add(text, result, scope=scope, vector=match["vector"])
+    _sync_semantic_cache(added=True)
+
+    return {**result, "cache": cache_info}
+
+
+@stub.function(
+    image=cache_image,
+    volumes={"/cache": brand_cache},
+    mounts=[modal.Mount.from_local_python_packages("modal_functions")]
+)
+def semantic_cache_stats() -> dict:
+    """Hit rate and lookup latency of the semantic cache, across all containers"""
+    from modal_functions.utils.semantic_cache import SemanticCache
+
+    brand_cache.reload()
+    return SemanticCache(None, path="/cache/semantic").stats()
+
+
 @stub.local_entrypoint()
 def main():
     """Test the brand analyzer locally"""
@@ -0,0 +1,434 @@
+"""
+Offline Batch Brand Generation
+
+Streams a JSONL file of brand inputs through the deployed analyzer (and
+optionally the logo generator) with bounded concurrency, writing results
+incrementally. Progress is checkpointed so a rerun skips completed rows.
+
+Each row is written once: rows are checkpointed right after their output
+is on disk, and on resume the writer reconciles the output with the
+checkpoint, marking rows that were written just before a crash as done
+(and dropping a partially written trailing JSONL line).
+
+Memory stays flat regardless of input size: input is read line by line,
+at most `concurrency` rows are in flight, and completed rows are tracked
+as merged row ranges.
+
+Input rows match analyze_brand's arguments:
+    {"business_idea": "...", "target_audience": "...", "style": "modern", "industry": "..."}
+
+Output rows:
+    {"row": 0, "input": {...}, "analysis": {...}, "logos": {...}}
+
+Output format follows the extension: .jsonl appends one row per line,
+.parquet writes a directory of part files (requires pyarrow).
+
+Requires: modal deploy modal_functions/brand_generation/analyzer.py
+          modal deploy modal_functions/brand_generation/logo_generator.py
+          modal deploy modal_functions/brand_generation/dispatcher.py
+Run: modal run modal_functions/brand_generation/batch_job.py --input-path brands.jsonl --output-path results.jsonl
+"""
+
+import asyncio
+import base64
+import bisect
+import json
+import os
+import time
+from typing import Awaitable, Callable, Iterator, Optional
+
+import modal
+
+# Create stub
+stub = modal.Stub("machups-batch-job")
+
+# Limits on rows buffered per Parquet part file
+PARQUET_ROWS_PER_PART = 100
+PARQUET_BYTES_PER_PART = 16 * 1024 * 1024  # 16MB of serialized JSON
+
+
+class Checkpoint:
+    """
+    Append-only record of completed row numbers
+
+    In memory, completed rows are kept as sorted, merged [start, end)
+    intervals, so memory grows with the number of gaps (in-flight or failed
+    rows) rather than with the number of rows.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.starts = []
+        self.ends = []
+
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        self._mark(int(line))
+
+        self._file = open(path, "a")
+
+    def _mark(self, row: int):
+        i = bisect.bisect_right(self.starts, row)
+        if i and self.ends[i - 1] > row:
+            return  # already recorded
+        joins_left = i > 0 and self.ends[i - 1] == row
+        joins_right = i < len(self.starts) and self.starts[i] == row + 1
+        if joins_left and joins_right:
+            self.ends[i - 1] = self.ends[i]
+            del self.starts[i], self.ends[i]
+        elif joins_left:
+            self.ends[i - 1] = row + 1
+        elif joins_right:
+            self.starts[i] = row
+        else:
+            self.starts.insert(i, row)
+            self.ends.insert(i, row + 1)
+
+    def done(self, row: int) -> bool:
+        i = bisect.bisect_right(self.starts, row)
+        return i > 0 and row < self.ends[i - 1]
+
+    def mark(self, rows: list[int]):
+        """Durably record completed rows"""
+        for row in rows:
+            self._file.write(f"{row}\n")
+            self._mark(row)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class JsonlWriter:
+    """Appends result rows to a JSONL file, one flush per row"""
+
+    def __init__(self, path: str, checkpoint: Checkpoint):
+        self.checkpoint = checkpoint
+        if os.path.exists(path):
+            self._recover(path)
+        self._file = open(path, "a")
+
+    def _recover(self, path: str):
+        """
+        Reconcile the output tail with the checkpoint after a crash
+
+        Rows are written and checkpointed one at a time, so only the last
+        line can be missing from the checkpoint, and only the last line can
+        be partially written.
+        """
+        with open(path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+            if end == 0:
+                return
+
+            # Walk back to the start of the last line, skipping the final
+            # byte (the newline of a complete line)
+            pos, start = end - 1, 0
+            while pos > 0:
+                step = min(pos, 64 * 1024)
+                f.seek(pos - step)
+                newline = f.read(step).rfind(b"\n")
+                if newline != -1:
+                    start = pos - step + newline + 1
+                    break
+                pos -= step
+            f.seek(start)
+            tail = f.read()
+
+            if not tail.endswith(b"\n"):
+                # Partial write: drop it, the row was never checkpointed
+                f.truncate(start)
+                return
+
+        row = json.loads(tail)["row"]
+        if not self.checkpoint.done(row):
+            self.checkpoint.mark([row])
+
+    def write(self, row: int, record: dict):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.checkpoint.mark([row])
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """
+    Buffers result rows and writes them as Parquet part files
+
+    A part is flushed when either the row count or the serialized size of
+    the buffer reaches its limit, so rows carrying base64 PNG logos cannot
+    grow the buffer without bound. Separate part files are used instead of
+    row groups in one file because a Parquet file is unreadable until its
+    footer is written on close, and a crash would lose every row group.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        checkpoint: Checkpoint,
+        rows_per_part: int = PARQUET_ROWS_PER_PART,
+        bytes_per_part: int = PARQUET_BYTES_PER_PART
+    ):
+        import pyarrow  # noqa: F401  (fail fast if missing)
+
+        self.path = path
+        self.checkpoint = checkpoint
+        self.rows_per_part = rows_per_part
+        self.bytes_per_part = bytes_per_part
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._run_id = time.strftime("%Y%m%d-%H%M%S")
+        self._parts = 0
+        os.makedirs(path, exist_ok=True)
+        self._recover()
+
+    def _recover(self):
+        """
+        Checkpoint rows of a part written just before a crash
+
+        Parts are checkpointed one at a time after being written, so only
+        the newest part can hold rows missing from the checkpoint.
+        """
+        import pyarrow.parquet as pq
+
+        parts = [os.path.join(self.path, name) for name in os.listdir(self.path)
+                 if name.endswith(".parquet")]
+        if not parts:
+            return
+        newest = max(parts, key=os.path.getmtime)
+        rows = pq.read_table(newest, columns=["row"]).column("row").to_pylist()
+        missing = [row for row in rows if not self.checkpoint.done(row)]
+        if missing:
+            self.checkpoint.mark(missing)
+
+    def write(self, row: int, record: dict):
+        # Serialize now so the buffer size is known exactly
+        columns = (
+            json.dumps(record["input"]),
+            json.dumps(record.get("analysis")),
+            json.dumps(record.get("logos"))
+        )
+        self._buffer.append((row, columns))
+        self._buffer_bytes += sum(len(column) for column in columns)
+        if len(self._buffer) >= self.rows_per_part or self._buffer_bytes >= self.bytes_per_part:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table({
+            "row": [row for row, _ in self._buffer],
+            "input": [columns[0] for _, columns in self._buffer],
+            "analysis": [columns[1] for _, columns in self._buffer],
+            "logos": [columns[2] for _, columns in self._buffer]
+        })
+        part = os.path.join(self.path, f"part-{self._run_id}-{self._parts:05d}.parquet")
+        pq.write_table(table, part)
+        self._parts += 1
+
+        # Rows only count as done once their part file is on disk
+        self.checkpoint.mark([row for row, _ in self._buffer])
+        self._buffer = []
+        self._buffer_bytes = 0
+
+    def close(self):
+        self.flush()
+
+
+def read_jsonl(path: str) -> Iterator[tuple[int, Optional[dict], Optional[str]]]:
+    """
+    Yield (row number, record, error) without loading the whole file
+
+    Malformed lines yield record=None and the parse error, so one bad row
+    cannot stop the job.
+    """
+    with open(path) as f:
+        for row, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield row, json.loads(line), None
+            except json.JSONDecodeError as exc:
+                yield row, None, f"invalid JSON: {exc}"
+
+
+def _encode_bytes(value):
+    """Make logo outputs JSON-serializable (PNG bytes -> base64)"""
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    if isinstance(value, dict):
+        return {k: _encode_bytes(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_encode_bytes(v) for v in value]
+    return value
+
+
+async def run_batch(
+    input_path: str,
+    output_path: str,
+    process: Callable[[dict], Awaitable[dict]],
+    concurrency: int = 16,
+    checkpoint_path: Optional[str] = None,
+    errors_path: Optional[str] = None
+) -> dict:
+    """
+    Stream input rows through `process`, writing results as they complete
+
+    Args:
+        input_path: JSONL input file
+        output_path: .jsonl file or .parquet directory
+        process: Coroutine mapping an input row to an output record
+        concurrency: Max rows in flight
+        checkpoint_path: Completed-row log (default: <output_path>.checkpoint)
+        errors_path: Failed-row log (default: <output_path>.errors.jsonl)
+
+    Returns:
+        dict with counts of processed, skipped and failed rows
+
+    Raises:
+        ValueError: if concurrency is less than 1
+    """
+    if concurrency < 1:
+        raise ValueError(f"concurrency must be at least 1, got {concurrency}")
+
+    counts = {"processed": 0, "skipped": 0, "failed": 0}
+    in_flight = {}
+    checkpoint = writer = errors = None
+
+    def fail(row, record, error):
+        # Failed rows are not checkpointed, so a rerun retries them
+        counts["failed"] += 1
+        errors.write(json.dumps({"row": row, "input": record, "error": error}) + "\n")
+        errors.flush()
+
+    def handle(done):
+        for task in done:
+            row, record = in_flight.pop(task)
+            try:
+                result = task.result()
+            except Exception as exc:
+                fail(row, record, repr(exc))
+            else:
+                counts["processed"] += 1
+                writer.write(row, {"row": row, "input": record, **_encode_bytes(result)})
+
+    try:
+        checkpoint = Checkpoint(checkpoint_path or f"{output_path}.checkpoint")
+        if output_path.endswith(".parquet"):
+            writer = ParquetWriter(output_path, checkpoint)
+        else:
+            writer = JsonlWriter(output_path, checkpoint)
+        errors = open(errors_path or f"{output_path}.errors.jsonl", "a")
+
+        for row, record, error in read_jsonl(input_path):
+            if checkpoint.done(row):
+                counts["skipped"] += 1
+                continue
+            if error:
+                fail(row, None, error)
+                continue
+            if len(in_flight) >= concurrency:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                handle(done)
+            in_flight[asyncio.ensure_future(process(record))] = (row, record)
+
+        while in_flight:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            handle(done)
+    finally:
+        try:
+            if writer is not None:
+                writer.close()  # may flush a final Parquet part
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+            if errors is not None:
+                errors.close()
+
+    return counts
+
+
+def modal_processor(
+    logos: bool = False,
+    use_ai: bool = False,
+    priority: str = "background",
+    tenant: str = "batch-job"
+) -> Callable[[dict], Awaitable[dict]]:
+    """
+    Build a row processor calling the deployed dispatcher
+
+    Going through the shared scheduler keeps bulk runs from starving
+    interactive requests. Rows shed by admission control are logged as
+    failed and retried on the next run.
+    """
+    dispatcher = modal.Cls.lookup("machups-dispatcher", "Dispatcher")()
+
+    async def process(record: dict) -> dict:
+        analysis = await dispatcher.analyze.remote.aio(
+            business_idea=record["business_idea"],
+            target_audience=record["target_audience"],
+            style=record.get("style", "modern"),
+            industry=record.get("industry"),
+            priority=priority,
+            tenant=tenant
+        )
+        output = {"analysis": analysis}
+
+        if logos:
+            output["logos"] = await dispatcher.logo_set.remote.aio(
+                brand_name=analysis["name"],
+                brand_analysis=analysis,
+                use_ai=use_ai,
+                priority=priority,
+                tenant=tenant
+            )
+
+        return output
+
+    return process
+
+
+@stub.local_entrypoint()
+def main(
+    input_path: str,
+    output_path: str,
+    concurrency: int = 16,
+    logos: bool = False,
+    use_ai: bool = False,
+    priority: str = "background",
+    tenant: str = "batch-job"
+):
+    """Run a resumable batch job against the deployed brand functions"""
+    start = time.time()
+    counts = asyncio.run(run_batch(
+        input_path,
+        output_path,
+        modal_processor(logos=logos, use_ai=use_ai, priority=priority, tenant=tenant),
+        concurrency=concurrency
+    ))
+
+    print("=" * 60)
+    print("BATCH JOB COMPLETE")
+    print("=" * 60)
+    print(f"Processed: {counts['processed']}")
+    print(f"Skipped (already done): {counts['skipped']}")
+    print(f"Failed: {counts['failed']}")
+    print(f"Time: {time.time() - start:.1f}s")
+    print("=" * 60)
+
+
+# To run:
+# modal run modal_functions/brand_generation/batch_job.py \
+#   --input-path brands.jsonl --output-path results.jsonl --concurrency 16 --logos
@@ -0,0 +1,136 @@
+"""
+Brand Generation Dispatcher Modal App
+
+Single entry point that routes brand analysis and logo set calls through
+one shared Scheduler (modal_functions/utils/scheduler.py). The app runs
+exactly one container (concurrency_limit=1) that accepts many concurrent
+inputs, so priority classes, per-pool limits and per-tenant quotas hold
+across every caller: the UI, analyze_brand_batch and the offline batch job.
+
+Requires: modal deploy modal_functions/brand_generation/analyzer.py
+          modal deploy modal_functions/brand_generation/logo_generator.py
+Deploy: modal deploy modal_functions/brand_generation/dispatcher.py
+Metrics: modal run modal_functions/brand_generation/dispatcher.py
+"""
+
+import modal
+from typing import Optional
+
+# Create stub
+stub = modal.Stub("machups-dispatcher")
+
+# Only dispatches .remote() calls, no heavy dependencies
+image = modal.Image.debian_slim()
+
+# The container's shared scheduler and deployed function handles
+_scheduler = None
+_functions = {}
+
+
+def _get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        from modal_functions.utils.scheduler import Scheduler
+        _scheduler = Scheduler()
+    return _scheduler
+
+
+def _function(app_name: str, name: str):
+    if name not in _functions:
+        _functions[name] = modal.Function.lookup(app_name, name)
+    return _functions[name]
+
+
+@stub.cls(
+    image=image,
+    mounts=[modal.Mount.from_local_python_packages("modal_functions")],
+    concurrency_limit=1,  # one container, one scheduler
+    allow_concurrent_inputs=1000,
+    keep_warm=1,
+    timeout=3900  # longest SLA (background) plus headroom
+)
+class Dispatcher:
+    """Admission-controlled front door for brand generation functions"""
+
+    @modal.method()
+    async def analyze(
+        self,
+        business_idea: str,
+        target_audience: str,
+        style: str = "modern",
+        industry: Optional[str] = None,
+        priority: str = "interactive",
+        tenant: str = "default"
+    ) -> dict:
+        """
+        Run analyze_brand on the CPU pool
+
+        Raises:
+            AdmissionRejected: if the call cannot meet its SLA
+        """
+        from modal_functions.utils.scheduler import remote_call
+
+        return await _get_scheduler().submit(
+            "analyze_brand",
+            remote_call(
+                _function("machups-brand-analyzer", "analyze_brand"),
+                business_idea=business_idea,
+                target_audience=target_audience,
+                style=style,
+                industry=industry
+            ),
+            pool="cpu",
+            priority=priority,
+            tenant=tenant
+        )
+
+    @modal.method()
+    async def logo_set(
+        self,
+        brand_name: str,
+        brand_analysis: dict,
+        use_ai: bool = True,
+        priority: str = "interactive",
+        tenant: str = "default"
+    ) -> dict:
+        """
+        Generate a logo set on the GPU pool, or HTML/CSS on CPU when use_ai
+        is False or the GPU queue would miss the SLA
+
+        Raises:
+            AdmissionRejected: if neither path can meet the SLA
+        """
+        from modal_functions.utils.scheduler import logo_set_request
+
+        return await logo_set_request(
+            _get_scheduler(),
+            _function("machups-logo-generator", "generate_complete_logo_set"),
+            _function("machups-logo-generator", "create_html_css_logo"),
+            brand_name,
+            brand_analysis,
+            use_ai=use_ai,
+            priority=priority,
+            tenant=tenant
+        )
+
+    @modal.method()
+    def metrics(self) -> dict:
+        """Queue depth, in-flight work and admission counters"""
+        return _get_scheduler().metrics()
+
+
+@stub.local_entrypoint()
+def main():
+    """Print the deployed dispatcher's scheduler metrics"""
+    import json
+
+    dispatcher = modal.Cls.lookup("machups-dispatcher", "Dispatcher")()
+    print("=" * 60)
+    print("DISPATCHER METRICS")
+    print("=" * 60)
+    print(json.dumps(dispatcher.metrics.remote(), indent=2))
+    print("=" * 60)
+
+
+# To deploy: modal deploy modal_functions/brand_generation/dispatcher.py
+# To view metrics: modal run modal_functions/brand_generation/dispatcher.py
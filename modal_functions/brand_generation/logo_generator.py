@@ -31,38 +31,23 @@ image = (
 # Volume for model caching
 model_cache = modal.Volume.from_name("logo-models", create_if_missing=True)
 
+NUM_INFERENCE_STEPS = 30
 
-@stub.function(
-    image=image,
-    gpu="T4",  # NVIDIA T4 - good for inference
-    cpu=4.0,
-    memory=16384,  # 16GB
-    volumes={"/cache": model_cache},
-    timeout=600
-)
-def generate_logo_sd(
-    prompt: str,
-    style: Literal["modern", "classic", "bold", "minimal"] = "modern",
-    color_scheme: str = "vibrant",
-    num_variations: int = 3
-) -> list[bytes]:
-    """
-    Generate logo using Stable Diffusion
+# Approximate linear map from SD v1.5 latent channels to RGB, used for
+# cheap progress previews without running the VAE decoder
+LATENT_RGB_FACTORS = [
+    [0.298, 0.207, 0.208],
+    [0.187, 0.286, 0.173],
+    [-0.158, 0.189, 0.264],
+    [-0.184, -0.271, -0.473]
+]
 
-    Args:
-        prompt: Brand name or description
-        style: Visual style
-        color_scheme: Color preference
-        num_variations: Number of logo variations to generate
 
-    Returns:
-        List of PNG image bytes
-    """
+def _load_pipeline():
+    """Load Stable Diffusion onto the GPU (weights cached in volume)"""
     from diffusers import StableDiffusionPipeline
     import torch
-    from io import BytesIO
 
-    # Load model (cached in volume)
     pipe = StableDiffusionPipeline.from_pretrained(
         "runwayml/stable-diffusion-v1-5",
         torch_dtype=torch.float16,
@@ -70,7 +55,11 @@ def generate_logo_sd(
     )
     pipe = pipe.to("cuda")
     pipe.enable_attention_slicing()  # Memory optimization
+    return pipe
 
+
+def _build_prompts(prompt: str, style: str, color_scheme: str) -> tuple[str, str]:
+    """Build the positive and negative prompts for a logo request"""
     # Style-specific prompts
     style_modifiers = {
         "modern": "clean, minimalist, geometric, sleek, contemporary",
@@ -88,27 +77,175 @@ def generate_logo_sd(
     watermark, signature, photo-realistic, 3d render, cluttered, busy,
     gradient mesh, photographic"""
 
+    return full_prompt, negative_prompt
+
+
+def _pipe_kwargs(full_prompt: str, negative_prompt: str, variation: int) -> dict:
+    """Pipeline arguments for one variation, shared by blocking and streaming modes"""
+    import torch
+
+    return {
+        "prompt": full_prompt,
+        "negative_prompt": negative_prompt,
+        "num_inference_steps": NUM_INFERENCE_STEPS,
+        "guidance_scale": 7.5,
+        "width": 512,
+        "height": 512,
+        "generator": torch.Generator(device="cuda").manual_seed(42 + variation)
+    }
+
+
+def _to_png(image) -> bytes:
+    """Encode a PIL image as PNG bytes"""
+    from io import BytesIO
+
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _latents_to_preview(latents) -> bytes:
+    """Project latents straight to a low-res RGB PNG"""
+    import torch
+    from PIL import Image
+
+    factors = torch.tensor(LATENT_RGB_FACTORS, dtype=latents.dtype, device=latents.device)
+    rgb = torch.einsum("chw,cr->hwr", latents[0], factors)
+    rgb = ((rgb + 1.0) / 2.0).clamp(0, 1).mul(255).byte().cpu().numpy()
+    return _to_png(Image.fromarray(rgb))
+
+
+@stub.function(
+    image=image,
+    gpu="T4",  # NVIDIA T4 - good for inference
+    cpu=4.0,
+    memory=16384,  # 16GB
+    volumes={"/cache": model_cache},
+    timeout=600
+)
+def generate_logo_sd(
+    prompt: str,
+    style: Literal["modern", "classic", "bold", "minimal"] = "modern",
+    color_scheme: str = "vibrant",
+    num_variations: int = 3
+) -> list[bytes]:
+    """
+    Generate logo using Stable Diffusion
+
+    Args:
+        prompt: Brand name or description
+        style: Visual style
+        color_scheme: Color preference
+        num_variations: Number of logo variations to generate
+
+    Returns:
+        List of PNG image bytes
+    """
+    pipe = _load_pipeline()
+    full_prompt, negative_prompt = _build_prompts(prompt, style, color_scheme)
+
     # Generate variations
     images = []
     for i in range(num_variations):
-        image = pipe(
-            prompt=full_prompt,
-            negative_prompt=negative_prompt,
-            num_inference_steps=30,
-            guidance_scale=7.5,
-            width=512,
-            height=512,
-            generator=torch.Generator(device="cuda").manual_seed(42 + i)
-        ).images[0]
-
-        # Convert to bytes
-        buffer = BytesIO()
-        image.save(buffer, format="PNG")
-        images.append(buffer.getvalue())
+        image = pipe(**_pipe_kwargs(full_prompt, negative_prompt, i)).images[0]
+
+        images.append(_to_png(image))
 
     return images
 
 
+@stub.function(
+    image=image,
+    gpu="T4",
+    cpu=4.0,
+    memory=16384,
+    volumes={"/cache": model_cache},
+    timeout=600
+)
+def generate_logo_sd_stream(
+    prompt: str,
+    style: Literal["modern", "classic", "bold", "minimal"] = "modern",
+    color_scheme: str = "vibrant",
+    num_variations: int = 3,
+    preview_interval: int = 5
+):
+    """
+    Generate logos with Stable Diffusion, streaming progress as it happens
+
+    Same prompts, seeds and settings as generate_logo_sd, so the final
+    images are identical to the blocking mode. Call with .remote_gen().
+
+    Args:
+        prompt: Brand name or description
+        style: Visual style
+        color_scheme: Color preference
+        num_variations: Number of logo variations to generate
+        preview_interval: Yield a preview every N denoising steps (0 disables)
+
+    Yields:
+        dict events:
+        - {"type": "preview", "variation", "step", "total_steps", "image"}:
+          64x64 PNG decoded directly from the latents (no VAE pass)
+        - {"type": "final", "variation", "image"}: full-size PNG bytes
+    """
+    import queue
+    import threading
+
+    pipe = _load_pipeline()
+    full_prompt, negative_prompt = _build_prompts(prompt, style, color_scheme)
+
+    for i in range(num_variations):
+        # The pipeline reports steps through a callback, so run it in a worker
+        # thread and hand previews back over a queue as they are produced.
+        events = queue.Queue()
+        # Set when the client stops reading, so the worker stops denoising
+        stop = threading.Event()
+
+        def on_step_end(pipeline, step, timestep, callback_kwargs, variation=i, stop=stop):
+            if stop.is_set():
+                pipeline._interrupt = True  # skip the remaining steps
+                return callback_kwargs
+            step += 1
+            if preview_interval and step % preview_interval == 0 and step < NUM_INFERENCE_STEPS:
+                events.put({
+                    "type": "preview",
+                    "variation": variation,
+                    "step": step,
+                    "total_steps": NUM_INFERENCE_STEPS,
+                    "image": _latents_to_preview(callback_kwargs["latents"])
+                })
+            return callback_kwargs
+
+        def run(variation=i, callback=on_step_end, stop=stop):
+            try:
+                image = pipe(
+                    **_pipe_kwargs(full_prompt, negative_prompt, variation),
+                    callback_on_step_end=callback,
+                    callback_on_step_end_tensor_inputs=["latents"]
+                ).images[0]
+                if not stop.is_set():
+                    events.put({"type": "final", "variation": variation, "image": _to_png(image)})
+            except Exception as exc:
+                events.put(exc)
+
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+
+        try:
+            while True:
+                event = events.get()
+                if isinstance(event, Exception):
+                    raise event
+                yield event
+                if event["type"] == "final":
+                    break
+        finally:
+            # Also runs on GeneratorExit when the client disconnects, so the
+            # GPU is free before this container takes its next input
+            stop.set()
+            worker.join()
+
+
 @stub.function(
     image=image,
     cpu=2.0,
@@ -213,6 +350,9 @@ async def generate_complete_logo_set(
     """
     Generate complete logo set (3 variations)
 
+    Callers should go through Dispatcher.logo_set (dispatcher.py) so GPU
+    work is admission-controlled and queued by priority.
+
     Args:
         brand_name: Brand name
         brand_analysis: Full brand analysis dict
@@ -296,6 +436,14 @@ def main():
     # )
     # print(f"Generated {len(ai_logos)} AI logo variations")
 
+    # Or stream previews and finals as they are produced
+    # for event in generate_logo_sd_stream.remote_gen(
+    #     prompt="MACHUPS tech startup",
+    #     num_variations=3,
+    #     preview_interval=5
+    # ):
+    #     print(f"{event['type']} variation={event['variation']} step={event.get('step', '-')}")
+
 
 # To run: modal run modal_functions/brand_generation/logo_generator.py
 # To deploy: modal deploy modal_functions/brand_generation/logo_generator.py
@@ -1,12 +1,28 @@
 """
-GPU Accelerated Modal Function Example
+GPU vs CPU Matrix Multiplication Benchmark
+
+This demonstrates how to use GPU acceleration in Modal, and measures it
+properly: a sweep of matrix sizes and dtypes, warmup iterations, and timing
+inside the container (perf_counter_ns, with torch.cuda.synchronize on GPU).
+Cold start, one-time torch/CUDA init, dispatch overhead and compute
+throughput are reported separately, as JSON.
 
-This demonstrates how to use GPU acceleration in Modal.
 Run with: modal run modal_functions/examples/gpu_example.py
+Options:  --sizes 512,1024,2048,4096 --dtypes float32,float16
+          --cpu-dtypes float32 --warmup 3 --iters 10 --output results.json
+CPU only, no Modal: python modal_functions/examples/gpu_example.py
 """
 
+import time
+
 import modal
 
+# Recorded at import, i.e. when a fresh container starts
+CONTAINER_STARTED_NS = time.time_ns()
+
+# Set once torch is imported and the device initialized in this process
+_device_ready = set()
+
 # Create stub
 stub = modal.Stub("machups-gpu-example")
 
@@ -17,83 +33,266 @@ image = modal.Image.debian_slim().pip_install(
     "pillow>=10.0.0"
 )
 
+DEFAULT_SIZES = "512,1024,2048,4096"
+DEFAULT_DTYPES = "float32,float16"
 
-@stub.function(
-    image=image,
-    gpu="T4",  # Use NVIDIA T4 GPU (cheapest option)
-    timeout=300  # 5 minute timeout
-)
-def matrix_multiply_gpu(size: int = 1000):
-    """Perform matrix multiplication on GPU"""
+# CPU half precision matmul has no fast kernel and can hit the timeout
+DEFAULT_CPU_DTYPES = "float32"
+
+
+def benchmark_matmul(
+    device: str,
+    sizes: list[int],
+    dtypes: list[str],
+    warmup: int = 3,
+    iters: int = 10
+) -> dict:
+    """
+    Time square matrix multiplication on the current machine
+
+    Args:
+        device: "cuda" or "cpu"
+        sizes: Matrix dimensions to sweep
+        dtypes: torch dtype names (e.g. float32, float16, bfloat16)
+        warmup: Untimed iterations per case (kernel selection, caches, clocks)
+        iters: Timed iterations per case
+
+    Returns:
+        dict with device info and one result per (size, dtype):
+        - median_ms / min_ms / p95_ms: Per-iteration compute time
+        - tflops: 2*n^3 FLOPs divided by the median time
+    """
+    import statistics
     import torch
 
-    # Create random matrices
-    a = torch.rand(size, size, device="cuda")
-    b = torch.rand(size, size, device="cuda")
+    def sync():
+        if device == "cuda":
+            torch.cuda.synchronize()
 
-    # Multiply on GPU
-    c = torch.matmul(a, b)
+    results = []
+    for dtype_name in dtypes:
+        dtype = getattr(torch, dtype_name)
+        for size in sizes:
+            a = torch.rand(size, size, device=device, dtype=dtype)
+            b = torch.rand(size, size, device=device, dtype=dtype)
+
+            try:
+                for _ in range(warmup):
+                    torch.matmul(a, b)
+                sync()
+            except RuntimeError as exc:
+                # e.g. half precision matmul not implemented on this CPU build
+                results.append({"size": size, "dtype": dtype_name, "error": str(exc)})
+                continue
+
+            timings_ns = []
+            for _ in range(iters):
+                sync()
+                start = time.perf_counter_ns()
+                torch.matmul(a, b)
+                sync()
+                timings_ns.append(time.perf_counter_ns() - start)
+
+            timings_ns.sort()
+            median_ns = statistics.median(timings_ns)
+            results.append({
+                "size": size,
+                "dtype": dtype_name,
+                "iters": iters,
+                "median_ms": round(median_ns / 1e6, 4),
+                "min_ms": round(timings_ns[0] / 1e6, 4),
+                "p95_ms": round(timings_ns[min(len(timings_ns) - 1, int(0.95 * len(timings_ns)))] / 1e6, 4),
+                "tflops": round(2 * size ** 3 / median_ns / 1e3, 4)
+            })
 
     return {
-        "size": size,
-        "device": str(c.device),
-        "result_sum": float(c.sum()),
-        "gpu_available": torch.cuda.is_available(),
-        "gpu_name": torch.cuda.get_device_name(0) if torch.cuda.is_available() else None
+        "device": device,
+        "device_name": torch.cuda.get_device_name(0) if device == "cuda" else None,
+        "torch_version": torch.__version__,
+        "threads": torch.get_num_threads(),
+        "results": results
     }
 
 
+def _init_device(device: str) -> float:
+    """
+    Import torch and create the device context, once per process
+
+    Returns the time spent (ms), or 0 if already initialized, so one-time
+    init is reported on its own rather than counted as compute.
+    """
+    if device in _device_ready:
+        return 0.0
+    start_ns = time.perf_counter_ns()
+    import torch
+
+    if device == "cuda":
+        torch.cuda.init()
+        torch.zeros(1, device="cuda")
+        torch.cuda.synchronize()
+    _device_ready.add(device)
+    return (time.perf_counter_ns() - start_ns) / 1e6
+
+
+def _run_in_container(device: str, sizes, dtypes, warmup, iters) -> dict:
+    """Benchmark and attach in-container timestamps for overhead accounting"""
+    received_ns = time.time_ns()
+    init_ms = _init_device(device)
+
+    compute_start_ns = time.time_ns()
+    report = benchmark_matmul(device, sizes, dtypes, warmup, iters)
+    report["container_started_ns"] = CONTAINER_STARTED_NS
+    report["received_ns"] = received_ns
+    report["init_ms"] = round(init_ms, 3)
+    report["compute_total_ms"] = round((time.time_ns() - compute_start_ns) / 1e6, 3)
+    return report
+
+
+@stub.function(
+    image=image,
+    gpu="T4",  # Use NVIDIA T4 GPU (cheapest option)
+    timeout=300  # 5 minute timeout
+)
+def benchmark_gpu(sizes: list[int], dtypes: list[str], warmup: int = 3, iters: int = 10) -> dict:
+    """Run the matmul sweep on GPU"""
+    return _run_in_container("cuda", sizes, dtypes, warmup, iters)
+
+
 @stub.function(
     image=image,
     cpu=2.0,  # CPU only (no GPU)
-    memory=4096  # 4GB RAM
+    memory=4096,  # 4GB RAM
+    timeout=300
 )
-def matrix_multiply_cpu(size: int = 1000):
-    """Perform matrix multiplication on CPU"""
-    import torch
+def benchmark_cpu(sizes: list[int], dtypes: list[str], warmup: int = 3, iters: int = 10) -> dict:
+    """Run the matmul sweep on CPU"""
+    return _run_in_container("cpu", sizes, dtypes, warmup, iters)
 
-    # Create random matrices on CPU
-    a = torch.rand(size, size)
-    b = torch.rand(size, size)
 
-    # Multiply on CPU
-    c = torch.matmul(a, b)
+def _measure_remote(function, sizes, dtypes, warmup, iters) -> dict:
+    """
+    Call a benchmark function twice and split end-to-end time into parts
 
-    return {
-        "size": size,
-        "device": str(c.device),
-        "result_sum": float(c.sum()),
-        "gpu_available": torch.cuda.is_available()
+    The first call may hit a cold container; the second should reuse it.
+    - dispatch_overhead_ms: warm call wall time minus its in-container time
+    - cold_start_ms: extra wall time of the first call over a warm dispatch,
+      excluding compute; includes container boot and torch/CUDA init
+    - init_ms: the torch import and device init part of the cold start
+    - import_to_first_request_ms: from module import in the container to
+      the first request arriving
+    If the two calls ran in different containers, cold start cannot be
+    separated from dispatch and is reported as None.
+    """
+    calls = []
+    for _ in range(2):
+        start_ns = time.time_ns()
+        report = function.remote(sizes, dtypes, warmup, iters)
+        calls.append((time.time_ns() - start_ns, report))
+
+    (cold_wall_ns, cold_report), (warm_wall_ns, warm_report) = calls
+    same_container = cold_report["container_started_ns"] == warm_report["container_started_ns"]
+
+    warm_in_container_ns = (warm_report["init_ms"] + warm_report["compute_total_ms"]) * 1e6
+    warm_dispatch_ns = warm_wall_ns - warm_in_container_ns
+    cold_start_ns = cold_wall_ns - cold_report["compute_total_ms"] * 1e6 - warm_dispatch_ns
+
+    warm_report["overhead"] = {
+        "cold_call_wall_ms": round(cold_wall_ns / 1e6, 3),
+        "warm_call_wall_ms": round(warm_wall_ns / 1e6, 3),
+        "cold_start_ms": round(cold_start_ns / 1e6, 3) if same_container else None,
+        "init_ms": cold_report["init_ms"],
+        "import_to_first_request_ms": round(
+            (cold_report["received_ns"] - cold_report["container_started_ns"]) / 1e6, 3
+        ),
+        "dispatch_overhead_ms": round(warm_dispatch_ns / 1e6, 3),
+        "same_container": same_container
     }
+    return warm_report
+
+
+def _print_table(report: dict):
+    label = report["device_name"] or f"CPU ({report['threads']} threads)"
+    print(f"\n{label}")
+    print(f"{'size':>6} {'dtype':>9} {'median ms':>10} {'p95 ms':>9} {'TFLOP/s':>8}")
+    for row in report["results"]:
+        if "error" in row:
+            print(f"{row['size']:>6} {row['dtype']:>9}   unsupported")
+            continue
+        print(f"{row['size']:>6} {row['dtype']:>9} {row['median_ms']:>10.3f} "
+              f"{row['p95_ms']:>9.3f} {row['tflops']:>8.3f}")
+    if "overhead" in report:
+        overhead = report["overhead"]
+        cold_start = overhead["cold_start_ms"]
+        cold_start = f"{cold_start:.0f} ms" if cold_start is not None else "n/a (container changed)"
+        print(f"cold start: {cold_start} (torch/device init {overhead['init_ms']:.0f} ms), "
+              f"dispatch overhead: {overhead['dispatch_overhead_ms']:.0f} ms")
+
+
+def _parse_list(value: str, cast=str) -> list:
+    return [cast(item.strip()) for item in value.split(",") if item.strip()]
 
 
 @stub.local_entrypoint()
-def main():
-    """Compare GPU vs CPU performance"""
-    import time
-
-    size = 2000
-
-    # GPU computation
-    print(f"Running {size}x{size} matrix multiplication on GPU...")
-    start = time.time()
-    gpu_result = matrix_multiply_gpu.remote(size)
-    gpu_time = time.time() - start
-    print(f"GPU Result: {gpu_result}")
-    print(f"GPU Time: {gpu_time:.3f}s")
-
-    # CPU computation
-    print(f"\nRunning {size}x{size} matrix multiplication on CPU...")
-    start = time.time()
-    cpu_result = matrix_multiply_cpu.remote(size)
-    cpu_time = time.time() - start
-    print(f"CPU Result: {cpu_result}")
-    print(f"CPU Time: {cpu_time:.3f}s")
-
-    # Speedup
-    if cpu_time > 0:
-        speedup = cpu_time / gpu_time
-        print(f"\nGPU Speedup: {speedup:.2f}x faster")
+def main(
+    sizes: str = DEFAULT_SIZES,
+    dtypes: str = DEFAULT_DTYPES,
+    cpu_dtypes: str = DEFAULT_CPU_DTYPES,
+    warmup: int = 3,
+    iters: int = 10,
+    output: str = ""
+):
+    """Benchmark GPU vs CPU and emit JSON results"""
+    import json
+
+    size_list = _parse_list(sizes, int)
+    dtype_list = _parse_list(dtypes)
+    cpu_dtype_list = _parse_list(cpu_dtypes)
+
+    print(f"Benchmarking sizes={size_list} gpu dtypes={dtype_list} cpu dtypes={cpu_dtype_list} "
+          f"(warmup={warmup}, iters={iters})")
+    report = {
+        "gpu": _measure_remote(benchmark_gpu, size_list, dtype_list, warmup, iters),
+        "cpu": _measure_remote(benchmark_cpu, size_list, cpu_dtype_list, warmup, iters)
+    }
+
+    _print_table(report["gpu"])
+    _print_table(report["cpu"])
+
+    # Compute-only speedup per case, from in-container timings
+    cpu_rows = {(r["size"], r["dtype"]): r for r in report["cpu"]["results"] if "error" not in r}
+    report["speedup"] = [
+        {"size": r["size"], "dtype": r["dtype"],
+         "gpu_vs_cpu": round(cpu_rows[(r["size"], r["dtype"])]["median_ms"] / r["median_ms"], 2)}
+        for r in report["gpu"]["results"]
+        if "error" not in r and (r["size"], r["dtype"]) in cpu_rows
+    ]
+
+    payload = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(payload)
+        print(f"\nWrote {output}")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    # Local CPU benchmark, no Modal account needed
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Local CPU matmul benchmark")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES)
+    parser.add_argument("--dtypes", default=DEFAULT_CPU_DTYPES)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--iters", type=int, default=10)
+    args = parser.parse_args()
+
+    report = benchmark_matmul(
+        "cpu", _parse_list(args.sizes, int), _parse_list(args.dtypes), args.warmup, args.iters
+    )
+    _print_table(report)
+    print(json.dumps(report, indent=2))
 
 
 # To run: modal run modal_functions/examples/gpu_example.py
@@ -0,0 +1,424 @@
+"""
+Scheduling and admission control for MACHUPS Modal functions
+
+Sits in front of .remote() calls so interactive UI requests are not starved
+by bulk jobs and GPU work cannot queue without limit. Provides:
+
+- Priority classes (interactive, batch, background)
+- Per-pool concurrency limits (cpu, gpu) and per-tenant quotas
+- Deadline-aware admission: work whose projected latency exceeds its SLA is
+  downgraded to a cheaper fallback (e.g. use_ai=False logos) or shed
+- Queue-depth and admission metrics
+
+Limits only hold across callers that share one Scheduler instance. In
+production that instance lives in the single dispatcher container
+(modal_functions/brand_generation/dispatcher.py), which all callers go
+through and which exposes metrics().
+
+Everything is plain asyncio, so the scheduler can be simulated locally with
+fake calls. Run: python -m modal_functions.utils.scheduler
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import Awaitable, Callable, Optional
+
+# Lower value = dispatched first
+PRIORITIES = {
+    "interactive": 0,
+    "batch": 1,
+    "background": 2
+}
+
+# Maximum acceptable end-to-end latency per priority class (seconds)
+DEFAULT_SLA = {
+    "interactive": 30.0,
+    "batch": 600.0,
+    "background": 3600.0
+}
+
+# Per-function latency budgets that override a shorter class SLA. A full AI
+# logo set is three sequential Stable Diffusion calls, so it cannot fit the
+# interactive class budget even on an idle GPU pool.
+DEFAULT_FUNCTION_SLA = {
+    "generate_complete_logo_set": 90.0
+}
+
+# Concurrent calls allowed per compute pool
+DEFAULT_POOL_LIMITS = {
+    "cpu": 32,
+    "gpu": 4
+}
+
+# Initial latency estimates (seconds), refined from observed durations
+DEFAULT_ESTIMATES = {
+    "analyze_brand": 8.0,
+    "create_html_css_logo": 0.5,
+    "generate_logo_sd": 12.0,  # per call, one variation on a warm T4
+    "generate_complete_logo_set": 40.0  # three generate_logo_sd calls
+}
+
+
+class AdmissionRejected(RuntimeError):
+    """Raised when a request is shed because it cannot meet its SLA"""
+
+
+class _Job:
+    """A queued call waiting for a pool slot"""
+
+    def __init__(self, seq, name, pool, priority, tenant, estimate, call, enqueued_at):
+        self.seq = seq
+        self.name = name
+        self.pool = pool
+        self.priority = priority
+        self.tenant = tenant
+        self.estimate = estimate
+        self.call = call
+        self.enqueued_at = enqueued_at
+        self.started_at = None
+        self.future = asyncio.get_running_loop().create_future()
+
+    def __lt__(self, other):
+        return (PRIORITIES[self.priority], self.seq) < (PRIORITIES[other.priority], other.seq)
+
+
+class Scheduler:
+    """
+    Priority scheduler with per-tenant quotas and deadline-aware admission
+
+    Args:
+        pool_limits: Max concurrent calls per pool (merged over defaults)
+        tenant_quota: Max concurrent calls per tenant across all pools
+        sla: Latency budget per priority class (merged over defaults)
+        function_sla: Per-function budgets that extend the class SLA
+            (merged over defaults)
+        estimates: Initial per-function latency estimates in seconds
+            (merged over defaults)
+        clock: Time source, overridable for simulation
+    """
+
+    def __init__(
+        self,
+        pool_limits: Optional[dict] = None,
+        tenant_quota: int = 8,
+        sla: Optional[dict] = None,
+        function_sla: Optional[dict] = None,
+        estimates: Optional[dict] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.pool_limits = {**DEFAULT_POOL_LIMITS, **(pool_limits or {})}
+        self.tenant_quota = tenant_quota
+        self.sla = {**DEFAULT_SLA, **(sla or {})}
+        self.function_sla = {**DEFAULT_FUNCTION_SLA, **(function_sla or {})}
+        self.estimates = {**DEFAULT_ESTIMATES, **(estimates or {})}
+        self.clock = clock
+
+        self._queues = {pool: [] for pool in self.pool_limits}
+        self._running = {pool: [] for pool in self.pool_limits}
+        self._tenant_inflight = {}
+        self._seq = itertools.count()
+        self._counters = {
+            "admitted": 0, "downgraded": 0, "shed": 0,
+            "completed": 0, "failed": 0, "cancelled": 0
+        }
+        self._wait_times = {priority: deque(maxlen=1000) for priority in PRIORITIES}
+
+    def estimate(self, name: str) -> float:
+        """Current latency estimate for a function (seconds)"""
+        return self.estimates.get(name, 1.0)
+
+    def projected_latency(self, name: str, pool: str, priority: str) -> float:
+        """
+        Projected queue wait plus run time for a new call
+
+        Counts the work already running in the pool and the queued work that
+        would be dispatched ahead of this call, spread over the pool's slots.
+        """
+        rank = PRIORITIES[priority]
+        now = self.clock()
+        running = sum(max(job.estimate - (now - job.started_at), 0.0) for job in self._running[pool])
+        ahead = sum(
+            job.estimate for job in self._queues[pool]
+            if PRIORITIES[job.priority] <= rank and not job.future.cancelled()
+        )
+
+        free_slots = self.pool_limits[pool] - len(self._running[pool])
+        wait = 0.0
+        if free_slots <= 0 or ahead > 0:
+            wait = (running + ahead) / self.pool_limits[pool]
+        return wait + self.estimate(name)
+
+    async def submit(
+        self,
+        name: str,
+        call: Callable[[], Awaitable],
+        pool: str = "cpu",
+        priority: str = "interactive",
+        tenant: str = "default",
+        fallback: Optional[tuple] = None
+    ):
+        """
+        Admit, queue and run a call, returning its result
+
+        Args:
+            name: Function name (used for latency estimates and metrics)
+            call: Zero-arg coroutine factory performing the actual call
+            pool: Compute pool ("cpu" or "gpu")
+            priority: Priority class
+            tenant: Tenant identifier for quota accounting
+            fallback: Optional (name, call, pool) used when the primary call
+                would miss its SLA, e.g. the HTML/CSS logo path
+
+        Cancelling the caller cancels the job: a queued job is dropped
+        before dispatch and a running call is cancelled.
+
+        Raises:
+            ValueError: for an unknown priority class or pool
+            AdmissionRejected: if neither the call nor its fallback fits the SLA
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority class: {priority}")
+        for candidate in [pool] + ([fallback[2]] if fallback else []):
+            if candidate not in self.pool_limits:
+                raise ValueError(f"Unknown pool: {candidate}")
+
+        budget = max(self.sla[priority], self.function_sla.get(name, 0.0))
+        if self.projected_latency(name, pool, priority) > budget:
+            if fallback and self.projected_latency(fallback[0], fallback[2], priority) <= budget:
+                name, call, pool = fallback
+                self._counters["downgraded"] += 1
+            else:
+                self._counters["shed"] += 1
+                raise AdmissionRejected(
+                    f"{name} ({priority}) projected to exceed {budget:.0f}s SLA"
+                )
+        self._counters["admitted"] += 1
+
+        job = _Job(next(self._seq), name, pool, priority, tenant,
+                   self.estimate(name), call, self.clock())
+        heapq.heappush(self._queues[pool], job)
+        self._dispatch(pool)
+        return await job.future
+
+    def _dispatch(self, pool: str):
+        """Start queued jobs while the pool has free slots"""
+        queue = self._queues[pool]
+        deferred = []
+        while queue and len(self._running[pool]) < self.pool_limits[pool]:
+            job = heapq.heappop(queue)
+            if job.future.cancelled():
+                # Caller gave up while queued; drop without using a slot
+                self._counters["cancelled"] += 1
+                continue
+            if self._tenant_inflight.get(job.tenant, 0) >= self.tenant_quota:
+                deferred.append(job)
+                continue
+            self._start(job)
+        for job in deferred:
+            heapq.heappush(queue, job)
+
+    def _start(self, job: _Job):
+        job.started_at = self.clock()
+        self._running[job.pool].append(job)
+        self._tenant_inflight[job.tenant] = self._tenant_inflight.get(job.tenant, 0) + 1
+        self._wait_times[job.priority].append(job.started_at - job.enqueued_at)
+        task = asyncio.ensure_future(self._run(job))
+        # Caller cancelled while running: cancel the call to free the slot
+        job.future.add_done_callback(lambda future: task.cancel() if future.cancelled() else None)
+
+    async def _run(self, job: _Job):
+        try:
+            result = await job.call()
+        except asyncio.CancelledError:
+            self._counters["cancelled"] += 1
+            raise
+        except Exception as exc:
+            self._counters["failed"] += 1
+            if not job.future.done():
+                job.future.set_exception(exc)
+        else:
+            self._counters["completed"] += 1
+            self._observe(job.name, self.clock() - job.started_at)
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._running[job.pool].remove(job)
+            self._tenant_inflight[job.tenant] -= 1
+            # A finished job frees a tenant slot that may unblock any pool
+            for pool in self._queues:
+                self._dispatch(pool)
+
+    def _observe(self, name: str, duration: float, alpha: float = 0.2):
+        """Update the latency estimate with an exponential moving average"""
+        previous = self.estimates.get(name, duration)
+        self.estimates[name] = (1 - alpha) * previous + alpha * duration
+
+    def metrics(self) -> dict:
+        """Snapshot of queue depth, in-flight work and admission counters"""
+        queue_depth = {}
+        for pool, queue in self._queues.items():
+            depth = {priority: 0 for priority in PRIORITIES}
+            for job in queue:
+                if not job.future.cancelled():
+                    depth[job.priority] += 1
+            queue_depth[pool] = depth
+
+        return {
+            "queue_depth": queue_depth,
+            "running": {pool: len(jobs) for pool, jobs in self._running.items()},
+            "tenant_inflight": {t: n for t, n in self._tenant_inflight.items() if n},
+            "counters": dict(self._counters),
+            "avg_wait": {
+                priority: round(sum(waits) / len(waits), 3) if waits else 0.0
+                for priority, waits in self._wait_times.items()
+            },
+            "estimates": {name: round(value, 3) for name, value in self.estimates.items()}
+        }
+
+
+def remote_call(function, **kwargs) -> Callable[[], Awaitable]:
+    """Wrap a Modal function call as a coroutine factory for Scheduler.submit"""
+    return lambda: function.remote.aio(**kwargs)
+
+
+def logo_set_request(scheduler: Scheduler, generate_complete_logo_set, create_html_css_logo,
+                     brand_name: str, brand_analysis: dict, use_ai: bool = True,
+                     priority: str = "interactive", tenant: str = "default"):
+    """
+    Submit an AI logo set on the GPU pool, downgrading to a CPU-only
+    HTML/CSS wordmark when the GPU queue would miss the SLA
+
+    With use_ai=False the HTML/CSS wordmark is submitted on the CPU pool
+    directly.
+
+    The fallback calls create_html_css_logo directly rather than
+    generate_complete_logo_set(use_ai=False), which would still start a GPU
+    container. Its result has the same shape as the use_ai=False path.
+    """
+    colors = brand_analysis.get("colors", {})
+    typography = brand_analysis.get("typography", {})
+
+    async def html_css_logo_set():
+        wordmark = await create_html_css_logo.remote.aio(
+            brand_name=brand_name,
+            primary_color=colors.get("primary", "#0066FF"),
+            secondary_color=colors.get("secondary", "#9333EA"),
+            font_family=typography.get("heading", "Inter")
+        )
+        return {
+            "wordmark": wordmark,
+            "format": "html-css",
+            "method": "html-css"
+        }
+
+    if not use_ai:
+        return scheduler.submit(
+            "create_html_css_logo",
+            html_css_logo_set,
+            pool="cpu",
+            priority=priority,
+            tenant=tenant
+        )
+
+    return scheduler.submit(
+        "generate_complete_logo_set",
+        remote_call(generate_complete_logo_set, brand_name=brand_name,
+                    brand_analysis=brand_analysis, use_ai=True),
+        pool="gpu",
+        priority=priority,
+        tenant=tenant,
+        fallback=("create_html_css_logo", html_css_logo_set, "cpu")
+    )
+
+
+async def simulate(time_scale: float = 0.01):
+    """
+    Local simulation: a nightly batch flood plus interactive traffic
+
+    Calls are replaced by sleeps of their estimated duration, scaled by
+    time_scale so the run finishes in seconds.
+    """
+    def scaled_scheduler():
+        return Scheduler(
+            pool_limits={"cpu": 8, "gpu": 2},
+            tenant_quota=6,
+            sla={priority: sla * time_scale for priority, sla in DEFAULT_SLA.items()},
+            function_sla={name: sla * time_scale for name, sla in DEFAULT_FUNCTION_SLA.items()},
+            estimates={name: est * time_scale for name, est in DEFAULT_ESTIMATES.items()}
+        )
+
+    # An idle scheduler must admit the AI logo set, not downgrade it
+    idle = scaled_scheduler()
+
+    def fake_function(name, result):
+        async def aio(**kwargs):
+            await asyncio.sleep(idle.estimate(name))
+            return result
+        return SimpleNamespace(remote=SimpleNamespace(aio=aio))
+
+    logo_set = await logo_set_request(
+        idle,
+        fake_function("generate_complete_logo_set", {"method": "ai-generated"}),
+        fake_function("create_html_css_logo", {"html": "", "css": ""}),
+        "MACHUPS",
+        {"colors": {}, "typography": {}}
+    )
+    assert logo_set["method"] == "ai-generated", logo_set
+    assert idle.metrics()["counters"]["downgraded"] == 0
+    print("Idle check: AI logo set admitted on an idle GPU pool")
+
+    scheduler = scaled_scheduler()
+
+    def fake(name):
+        async def call():
+            await asyncio.sleep(scheduler.estimate(name))
+            return name
+        return call
+
+    async def guarded(coro):
+        try:
+            return await coro
+        except AdmissionRejected:
+            return "shed"
+
+    tasks = []
+    # Nightly bulk analysis from one tenant
+    for _ in range(60):
+        tasks.append(guarded(scheduler.submit(
+            "analyze_brand", fake("analyze_brand"),
+            pool="cpu", priority="batch", tenant="nightly"
+        )))
+    # Interactive users, each also requesting GPU logos
+    for user in range(12):
+        tasks.append(guarded(scheduler.submit(
+            "analyze_brand", fake("analyze_brand"),
+            pool="cpu", priority="interactive", tenant=f"user-{user}"
+        )))
+        tasks.append(guarded(scheduler.submit(
+            "generate_logo_sd", fake("generate_logo_sd"),
+            pool="gpu", priority="interactive", tenant=f"user-{user}",
+            fallback=("create_html_css_logo", fake("create_html_css_logo"), "cpu")
+        )))
+
+    gathered = asyncio.gather(*tasks)
+    await asyncio.sleep(0)
+    print("Queued:", scheduler.metrics()["queue_depth"])
+    results = await gathered
+
+    metrics = scheduler.metrics()
+    print("=" * 60)
+    print("SCHEDULER SIMULATION")
+    print("=" * 60)
+    print(f"Results: {len(results)} ({results.count('shed')} shed)")
+    for key, value in metrics.items():
+        print(f"{key}: {value}")
+    print("=" * 60)
+    return metrics
+
+
+if __name__ == "__main__":
+    asyncio.run(simulate())
@@ -0,0 +1,287 @@
+"""
+Semantic cache for brand analysis
+
+Exact-hash caching misses paraphrased business ideas ("eco coffee delivery
+for city workers" vs "sustainable coffee delivery for urban professionals").
+This cache embeds normalized inputs with a small local CPU model and keeps
+the vectors in flat NumPy indexes, so near-duplicates can reuse (or seed)
+a prior analysis.
+
+- One float32 matrix of unit vectors per scope (style/industry), so only
+  comparable analyses match and a lookup is a single matrix-vector dot
+  product over that scope's entries
+- Persisted as append-only shards, one per container: each container only
+  ever appends to its own shard, and picks up other shards' new entries
+  incrementally on refresh(), so concurrent containers never overwrite
+  each other
+- Tracks hit rate and the latency of the lookup itself, per shard
+
+Shard layout under `path`:
+    <shard>/meta.json      {"dim": 384}
+    <shard>/vectors.f32    raw float32 rows, appended
+    <shard>/entries.jsonl  {"scope": ..., "result": ...} per row, appended
+    <shard>/stats.json     this shard's counters and recent lookup latencies
+"""
+
+import json
+import os
+import re
+import time
+import uuid
+from typing import Callable, Optional
+
+import numpy as np
+
+# Small sentence embedding model, fast on CPU (384 dimensions)
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Cosine similarity required to return a cached analysis as-is
+HIT_THRESHOLD = 0.90
+
+# Cosine similarity at which a cached analysis is used to seed a new one
+SEED_THRESHOLD = 0.75
+
+# Recent lookup latencies kept per shard
+LATENCY_WINDOW = 1000
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace"""
+    text = re.sub(r"[^\w\s]", " ", (text or "").lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def cache_scope(style: str, industry: Optional[str]) -> str:
+    """Partition key: only analyses with the same style and industry match"""
+    return f"{normalize_text(style)}|{normalize_text(industry or '')}"
+
+
+def load_embedder(model_name: str = DEFAULT_MODEL, cache_dir: Optional[str] = None) -> Callable:
+    """Load a local CPU embedding function returning unit-length vectors"""
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu", cache_folder=cache_dir)
+
+    def embed(text: str) -> np.ndarray:
+        return model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+    return embed
+
+
+class _ScopeIndex:
+    """Growable matrix of unit vectors and their results for one scope"""
+
+    def __init__(self, dim: int):
+        self.vectors = np.zeros((64, dim), dtype=np.float32)
+        self.results = []
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def add(self, vector: np.ndarray, result: dict):
+        size = len(self.results)
+        if size == self.vectors.shape[0]:
+            # Grow by doubling to keep appends amortized O(1)
+            grown = np.zeros((size * 2, self.vectors.shape[1]), dtype=np.float32)
+            grown[:size] = self.vectors
+            self.vectors = grown
+        self.vectors[size] = vector
+        self.results.append(result)
+
+    def nearest(self, vector: np.ndarray) -> tuple[float, dict]:
+        scores = self.vectors[:len(self.results)] @ vector
+        best = int(np.argmax(scores))
+        return float(scores[best]), self.results[best]
+
+
+class SemanticCache:
+    """
+    Array-backed nearest-neighbour cache of brand analyses
+
+    Args:
+        embed: Function mapping text to a vector (normalized here if not
+            already); may be None when only reading stats
+        hit_threshold: Similarity to return a cached result directly
+        seed_threshold: Similarity to return a cached result as a seed
+        path: Optional directory holding the persisted shards
+        shard: Name of this instance's shard (default: random per instance)
+    """
+
+    def __init__(
+        self,
+        embed: Optional[Callable[[str], np.ndarray]],
+        hit_threshold: float = HIT_THRESHOLD,
+        seed_threshold: float = SEED_THRESHOLD,
+        path: Optional[str] = None,
+        shard: Optional[str] = None
+    ):
+        self.embed = embed
+        self.hit_threshold = hit_threshold
+        self.seed_threshold = seed_threshold
+        self.path = path
+        self.shard = shard or uuid.uuid4().hex
+
+        self._scopes = {}
+        self._size = 0
+        self._stats = {"lookups": 0, "hits": 0, "seeded": 0, "misses": 0}
+        self._lookup_ms = []
+        # Rows already read from each other shard
+        self._offsets = {}
+
+        if path:
+            self.refresh()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.embed(normalize_text(text)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _insert(self, vector: np.ndarray, result: dict, scope: str):
+        index = self._scopes.get(scope)
+        if index is None:
+            index = self._scopes[scope] = _ScopeIndex(vector.shape[0])
+        index.add(vector, result)
+        self._size += 1
+
+    def lookup(self, text: str, scope: str = "") -> dict:
+        """
+        Find the nearest prior analysis in the same scope
+
+        Returns:
+            dict with:
+            - status: "hit", "seed" or "miss"
+            - similarity: Cosine similarity of the nearest in-scope entry,
+              or None if the scope has no entries
+            - result: Cached analysis for hits and seeds, else None
+            - lookup_ms: Time spent embedding and searching
+        """
+        start = time.perf_counter()
+        vector = self._vector(text)
+
+        status, similarity, result = "miss", None, None
+        index = self._scopes.get(scope)
+        if index is not None and len(index):
+            similarity, nearest = index.nearest(vector)
+            if similarity >= self.hit_threshold:
+                status, result = "hit", nearest
+            elif similarity >= self.seed_threshold:
+                status, result = "seed", nearest
+
+        lookup_ms = (time.perf_counter() - start) * 1000
+        self._stats["lookups"] += 1
+        self._stats[{"hit": "hits", "seed": "seeded", "miss": "misses"}[status]] += 1
+        self._lookup_ms.append(lookup_ms)
+        del self._lookup_ms[:-LATENCY_WINDOW]
+
+        return {
+            "status": status,
+            "similarity": None if similarity is None else round(similarity, 4),
+            "result": result,
+            "lookup_ms": round(lookup_ms, 3),
+            "vector": vector
+        }
+
+    def add(self, text: str, result: dict, scope: str = "", vector: Optional[np.ndarray] = None):
+        """
+        Store an analysis and append it to this instance's shard
+
+        Pass the vector from lookup() to avoid re-embedding. Persisting costs
+        one appended row, independent of the cache size.
+        """
+        if vector is None:
+            vector = self._vector(text)
+        vector = np.asarray(vector, dtype=np.float32)
+        self._insert(vector, result, scope)
+
+        if not self.path:
+            return
+        shard_dir = os.path.join(self.path, self.shard)
+        if not os.path.exists(shard_dir):
+            os.makedirs(shard_dir)
+            with open(os.path.join(shard_dir, "meta.json"), "w") as f:
+                json.dump({"dim": int(vector.shape[0])}, f)
+
+        # Vector first: a row only counts once its entry line is complete
+        with open(os.path.join(shard_dir, "vectors.f32"), "ab") as f:
+            f.write(vector.tobytes())
+        with open(os.path.join(shard_dir, "entries.jsonl"), "a") as f:
+            f.write(json.dumps({"scope": scope, "result": result}) + "\n")
+
+    def refresh(self):
+        """Read entries other shards have appended since the last refresh"""
+        if not self.path or not os.path.isdir(self.path):
+            return
+
+        for shard in os.listdir(self.path):
+            if shard == self.shard:
+                continue
+            shard_dir = os.path.join(self.path, shard)
+            meta_path = os.path.join(shard_dir, "meta.json")
+            entries_path = os.path.join(shard_dir, "entries.jsonl")
+            if not (os.path.exists(meta_path) and os.path.exists(entries_path)):
+                continue
+
+            with open(meta_path) as f:
+                dim = json.load(f)["dim"]
+
+            rows_read, byte_offset = self._offsets.get(shard, (0, 0))
+            entries = []
+            with open(entries_path, "rb") as f:
+                f.seek(byte_offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # partially written, pick it up next time
+                    entries.append(json.loads(line))
+                    byte_offset += len(line)
+            if not entries:
+                continue
+
+            vectors = np.fromfile(
+                os.path.join(shard_dir, "vectors.f32"),
+                dtype=np.float32,
+                count=len(entries) * dim,
+                offset=rows_read * dim * 4
+            ).reshape(-1, dim)
+
+            for vector, entry in zip(vectors, entries):
+                self._insert(vector, entry["result"], entry["scope"])
+            self._offsets[shard] = (rows_read + len(entries), byte_offset)
+
+    def save_stats(self):
+        """Persist this shard's counters and recent lookup latencies"""
+        if not self.path:
+            return
+        shard_dir = os.path.join(self.path, self.shard)
+        os.makedirs(shard_dir, exist_ok=True)
+        with open(os.path.join(shard_dir, "stats.json"), "w") as f:
+            json.dump({"counters": self._stats, "lookup_ms": self._lookup_ms}, f)
+
+    def stats(self) -> dict:
+        """Hit rate and lookup latency, aggregated over all shards"""
+        counters = dict(self._stats)
+        latencies = list(self._lookup_ms)
+
+        if self.path and os.path.isdir(self.path):
+            for shard in os.listdir(self.path):
+                stats_path = os.path.join(self.path, shard, "stats.json")
+                if shard == self.shard or not os.path.exists(stats_path):
+                    continue
+                with open(stats_path) as f:
+                    saved = json.load(f)
+                for key, value in saved["counters"].items():
+                    counters[key] = counters.get(key, 0) + value
+                latencies.extend(saved["lookup_ms"])
+
+        lookups = counters["lookups"]
+        latencies = np.array(latencies) if latencies else np.zeros(1)
+        return {
+            **counters,
+            "entries": self._size,
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+            "seed_rate": round(counters["seeded"] / lookups, 4) if lookups else 0.0,
+            "lookup_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+            "lookup_ms_p95": round(float(np.percentile(latencies, 95)), 3)
+        }